@@ -1,17 +1,27 @@
 #!/usr/bin/env python
+import asyncio
 import csv
+import json
+import threading
 import time
 from collections import defaultdict
-from dataclasses import dataclass
-from multiprocessing import Pool
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from typing import Union
 
 import click
+import msgpack
 import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
 
 DEFAULT_JOBS = 4
+MSGPACK_MIMETYPE = "application/msgpack"
+WIRE_FORMATS = ("json", "msgpack")
+EJECT_SECONDS = 10
 RETRY_SECONDS = 5
+DEFAULT_TIMEOUT = 30
+READY_TIMEOUT = 2
 
 
 @dataclass
@@ -19,28 +29,223 @@ class Intent:
     label: str
 
 
-class IntentClassifierClient:
-    def __init__(self, api_url):
-        self.api_url = api_url
+@dataclass
+class Replica:
+    """A single service endpoint with its own keep-alive connection pool."""
 
-    def ready(self) -> bool:
-        ready_url = self.api_url + "/ready"
+    url: str
+    session: requests.Session
+    in_flight: int = 0
+    ejected_until: float = 0.0
+    failures: int = 0
+    latencies: list[float] = field(default_factory=list)
+    bytes_sent: list[int] = field(default_factory=list)
+    bytes_received: list[int] = field(default_factory=list)
+    server_decode: list[float] = field(default_factory=list)
+    server_encode: list[float] = field(default_factory=list)
+
+
+class IntentClassifierClient:
+    """Client that balances requests between one or several service replicas.
+
+    Each request goes to the replica with the fewest requests in flight.
+    Replicas that can't be reached, time out, are not ready or answer with
+    a server error are ejected for EJECT_SECONDS and added back once their
+    `/ready` endpoint succeeds, which is checked in the background.
+
+    The requests are encoded as JSON or MessagePack depending on wire_format.
+    With label_indices, the service answers with indices into the labels
+    published by `/info`, which the client translates back to labels.
+    """
+
+    def __init__(
+        self,
+        api_urls: Union[str, list[str]],
+        pool_size=DEFAULT_JOBS,
+        wire_format="json",
+        label_indices=False,
+        timeout=DEFAULT_TIMEOUT,
+    ):
+        if isinstance(api_urls, str):
+            api_urls = [api_urls]
+        if not api_urls:
+            raise ValueError("Please provide at least one API URL")
+        if wire_format not in WIRE_FORMATS:
+            raise ValueError(f"Unknown wire format {wire_format}")
+
+        self.pool_size = pool_size
+        self.wire_format = wire_format
+        self.label_indices = label_indices
+        self.timeout = timeout
+        self.labels: dict[str, list[str]] = {}
+        self.lock = threading.Lock()
+        self.replicas = [
+            Replica(url=url.rstrip("/"), session=self._session(pool_size))
+            for url in api_urls
+        ]
+
+    @staticmethod
+    def _session(pool_size) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @staticmethod
+    def _is_ready(replica) -> bool:
         try:
-            return requests.get(ready_url).status_code == 200
-        except requests.exceptions.ConnectionError:
+            response = replica.session.get(
+                replica.url + "/ready", timeout=READY_TIMEOUT
+            )
+        except requests.exceptions.RequestException:
             return False
+        return response.status_code == 200
+
+    def _eject(self, replica):
+        with self.lock:
+            replica.ejected_until = time.monotonic() + EJECT_SECONDS
+
+    def _readmit(self):
+        """Start checking the ejected replicas whose time is up.
+
+        The checks run on their own threads so that a hung replica
+        doesn't hold up the request that happened to notice it.
+        """
+        now = time.monotonic()
+        with self.lock:
+            due = [r for r in self.replicas if 0 < r.ejected_until <= now]
+            for replica in due:
+                # Keep other threads from checking the same replica meanwhile
+                replica.ejected_until = now + EJECT_SECONDS
+
+        for replica in due:
+            threading.Thread(target=self._recheck, args=(replica,), daemon=True).start()
+
+    def _recheck(self, replica):
+        if self._is_ready(replica):
+            with self.lock:
+                replica.ejected_until = 0.0
+
+    def _acquire(self) -> Replica:
+        """Choose the healthy replica with the fewest requests in flight."""
+        self._readmit()
+        with self.lock:
+            healthy = [r for r in self.replicas if not r.ejected_until]
+            replica = min(healthy or self.replicas, key=lambda r: r.in_flight)
+            replica.in_flight += 1
+            return replica
+
+    def _release(self, replica, latency=None):
+        with self.lock:
+            replica.in_flight -= 1
+            if latency is None:
+                replica.failures += 1
+            else:
+                replica.latencies.append(latency)
+
+    def ready(self) -> bool:
+        """Check all replicas, ejecting the ones that are not ready.
+
+        Returns True if at least one replica is ready.
+        """
+        result = False
+        for replica in self.replicas:
+            if self._is_ready(replica):
+                with self.lock:
+                    replica.ejected_until = 0.0
+                result = True
+            else:
+                self._eject(replica)
+        return result
 
     def info(self) -> dict:
-        return requests.get(self.api_url + "/info").json()
+        replica = next((r for r in self.replicas if not r.ejected_until), None)
+        replica = replica or self.replicas[0]
+        info = replica.session.get(replica.url + "/info", timeout=self.timeout).json()
+        self.labels = {model["key"]: model["labels"] for model in info["models"]}
+        return info
+
+    def _encode(self, payload) -> tuple[bytes, dict]:
+        if self.wire_format == "msgpack":
+            headers = {"Content-Type": MSGPACK_MIMETYPE, "Accept": MSGPACK_MIMETYPE}
+            return msgpack.packb(payload), headers
+        return json.dumps(payload).encode(), {"Content-Type": "application/json"}
+
+    @staticmethod
+    def _decode(response):
+        if response.headers.get("Content-Type") == MSGPACK_MIMETYPE:
+            return msgpack.unpackb(response.content, raw=False)
+        return response.json()
+
+    @staticmethod
+    def _server_timing(response) -> dict[str, float]:
+        """Seconds reported for each metric in the Server-Timing header."""
+        timing = {}
+        for metric in response.headers.get("Server-Timing", "").split(","):
+            name, _, duration = metric.strip().partition(";dur=")
+            if duration:
+                timing[name] = float(duration) / 1000
+        return timing
 
     def intents(self, text):
-        intent_url = self.api_url + "/intent"
-        response = requests.post(intent_url, json={"text": text})
-        if response.status_code != 200:
-            return None
-        intents = response.json().get("intents")
+        payload = {"text": text}
+        if self.label_indices:
+            if not self.labels:
+                self.info()
+            payload["label_indices"] = True
+        data, headers = self._encode(payload)
+
+        replica = self._acquire()
+        start_time = time.time()
+        latency = None
+        try:
+            response = replica.session.post(
+                replica.url + "/intent",
+                data=data,
+                headers=headers,
+                timeout=self.timeout,
+            )
+            if response.status_code == 423 or response.status_code >= 500:
+                self._eject(replica)
+            if response.status_code != 200:
+                return None
+
+            result = self._decode(response)
+            latency = time.time() - start_time
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self._eject(replica)
+            raise
+        finally:
+            self._release(replica, latency)
+
+        replica.bytes_sent.append(len(data))
+        replica.bytes_received.append(len(response.content))
+        server_timing = self._server_timing(response)
+        if "decode" in server_timing:
+            replica.server_decode.append(server_timing["decode"])
+        if "encode" in server_timing:
+            replica.server_encode.append(server_timing["encode"])
+
+        intents = result.get("intents")
+        if self.label_indices:
+            labels = self.labels[result["model"]]
+            return [Intent(label=labels[ix]) for ix in intents]
         return [Intent(label=obj["label"]) for obj in intents]
 
+    def intents_batch(self, texts, jobs=None):
+        """Classify several texts in parallel, preserving their order."""
+        with ThreadPoolExecutor(jobs or self.pool_size) as executor:
+            return list(executor.map(self.intents, texts))
+
+    async def intents_batch_async(self, texts, jobs=None):
+        """Awaitable version of intents_batch."""
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(jobs or self.pool_size) as executor:
+            return await asyncio.gather(
+                *(loop.run_in_executor(executor, self.intents, t) for t in texts)
+            )
+
 
 def format_confusion(c):
     return click.style(f"{c:.02}", fg="green")
@@ -83,6 +288,10 @@ def format_ms(seconds):
     return click.style(int(seconds * 1000), fg="yellow") + "ms"
 
 
+def format_cpu_ms(seconds):
+    return click.style(f"{seconds * 1000:.2f}", fg="yellow") + "ms"
+
+
 def format_percentage(p):
     return click.style(f"{100 * p:.2f}", fg="green") + "%"
 
@@ -103,6 +312,35 @@ def format_url(url):
     return click.style(url, fg="blue", underline=True)
 
 
+def format_payload_stats(replicas, wire_format):
+    sent, received, decode, encode = (
+        [value for replica in replicas for value in getattr(replica, name)] or [0]
+        for name in ("bytes_sent", "bytes_received", "server_decode", "server_encode")
+    )
+    f_sent, f_received = (format_integer(np.mean(b)) for b in (sent, received))
+    f_decode, f_encode = (format_cpu_ms(np.mean(t)) for t in (decode, encode))
+    return (
+        f"Payload ({format_dim(wire_format)}): avg {f_sent} bytes sent,"
+        f" {f_received} bytes received;"
+        f" server CPU avg {f_decode} decoding, {f_encode} encoding per request"
+    )
+
+
+def format_replica_stats(replicas, time_taken):
+    def format_replica(replica):
+        times = replica.latencies or [0.0]
+        f_avg, f_95 = format_ms(np.mean(times)), format_ms(np.percentile(times, 95))
+        f_count = format_integer(len(replica.latencies))
+        f_rps = format_integer(len(replica.latencies) / time_taken)
+        f_failed = format_integer(replica.failures)
+        return (
+            f"  {format_url(replica.url)}: {f_count} answers ({f_failed} failed),"
+            f" {f_rps} requests per second, avg {f_avg}, 95% {f_95}"
+        )
+
+    return "\n".join(map(format_replica, replicas))
+
+
 def f1_score(tp, fp, fn):
     assert tp or fn or fp
     return 2 * tp / (2 * tp + fn + fp)
@@ -147,7 +385,8 @@ def _get_intent(client, query, correct_label):
     "-u",
     "--url",
     required=True,
-    help="Base URL for the intents API",
+    multiple=True,
+    help="Base URL for the intents API (repeat to balance between replicas)",
 )
 @click.option(
     "-m",
@@ -164,6 +403,27 @@ def _get_intent(client, query, correct_label):
     show_default=True,
     help="The number of requests to run in parallel",
 )
+@click.option(
+    "-w",
+    "--wire-format",
+    type=click.Choice(WIRE_FORMATS),
+    default="json",
+    show_default=True,
+    help="Encoding of the requests and responses",
+)
+@click.option(
+    "--label-indices",
+    is_flag=True,
+    help="Receive label indices instead of label strings",
+)
+@click.option(
+    "-t",
+    "--timeout",
+    type=float,
+    default=DEFAULT_TIMEOUT,
+    show_default=True,
+    help="Seconds to wait for a replica before ejecting it",
+)
 @click.option(
     "-o",
     "--output",
@@ -171,9 +431,25 @@ def _get_intent(client, query, correct_label):
     show_default=True,
     help="Output errors in TSV format (- for stdout)",
 )
-def benchmark(tsv_file, url: str, jobs: int, model_index: int, output):
-    click.echo(f"Using base URL: {format_url(url)}")
-    client = IntentClassifierClient(url)
+def benchmark(
+    tsv_file,
+    url: tuple[str, ...],
+    jobs: int,
+    model_index: int,
+    wire_format: str,
+    label_indices: bool,
+    timeout: float,
+    output,
+):  # pylint: disable=too-many-arguments
+    for replica_url in url:
+        click.echo(f"Using base URL: {format_url(replica_url)}")
+    client = IntentClassifierClient(
+        list(url),
+        pool_size=jobs,
+        wire_format=wire_format,
+        label_indices=label_indices,
+        timeout=timeout,
+    )
 
     while not client.ready():
         message = f"API is not ready, will retry in {RETRY_SECONDS} seconds..."
@@ -206,20 +482,19 @@ def benchmark(tsv_file, url: str, jobs: int, model_index: int, output):
                 incorrect_lines.append((model_label, correct_label, query))
             progress.update(1)
 
-        def failure(_):
+        def failure():
             stats[None] += 1
             progress.update(1)
 
-        with Pool(jobs) as pool:
-            for datum in data:
-                _ = pool.apply_async(
-                    _get_intent,
-                    (client, *datum),
-                    callback=success,
-                    error_callback=failure,
-                )
-            pool.close()
-            pool.join()
+        with ThreadPoolExecutor(jobs) as executor:
+            futures = [executor.submit(_get_intent, client, *datum) for datum in data]
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception:  # pylint: disable=broad-exception-caught
+                    failure()
+                else:
+                    success(result)
 
         progress.finish()
 
@@ -256,6 +531,13 @@ F1 scores for each class:
 
     click.echo(f_statistics)
     click.echo()
+    click.echo(format_payload_stats(client.replicas, wire_format))
+    click.echo()
+
+    if len(client.replicas) > 1:
+        click.echo("Replicas:")
+        click.echo(format_replica_stats(client.replicas, time_taken))
+        click.echo()
 
     if output:
         click.echo(f"Incorrect answers to be written to {format_stream(output)}")
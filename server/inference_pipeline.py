@@ -0,0 +1,170 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_QUEUE_SIZE = 8
+
+# Seconds a batched stage waits for more items after the first one
+DEFAULT_BATCH_WAIT = 0.002
+
+# Weight of the newest item in the moving average of stage times
+ITEM_TIME_SMOOTHING = 0.2
+
+
+def threads_patched() -> bool:
+    """Whether gevent has replaced the threads of this process with greenlets."""
+    try:
+        from gevent import monkey  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+class PipelineStage:
+    """A function run by a pipeline on its own thread, with its busy time.
+
+    With a batch_size above 1, the function takes a list of up to that many
+    items and returns the list of their results.
+    """
+
+    def __init__(self, name, function, batch_size=1):
+        self.name = name
+        self.function = function
+        self.batch_size = batch_size
+        self.items = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+        self.item_seconds = None
+
+    def record(self, seconds, count=1):
+        self.items += count
+        self.batches += 1
+        self.busy_seconds += seconds
+        seconds /= count
+        if self.item_seconds is None:
+            self.item_seconds = seconds
+        else:
+            self.item_seconds += ITEM_TIME_SMOOTHING * (seconds - self.item_seconds)
+
+
+class InferencePipeline:
+    """Run a sequence of functions concurrently, each on its own thread.
+
+    Items are passed between the stages through bounded queues,
+    so that a stage can work on the next item
+    while the following stage is still busy with the previous one.
+    A batched stage takes the items queued for it together, waiting up to
+    batch_wait seconds after the first one for more to arrive.
+
+    The stages need real threads: under gevent they would become greenlets
+    that run one after another, since a running model never yields.
+    """
+
+    def __init__(
+        self, stages, queue_size=DEFAULT_QUEUE_SIZE, batch_wait=DEFAULT_BATCH_WAIT
+    ):
+        if threads_patched():
+            raise RuntimeError(
+                "Pipelines need real threads, which gevent has patched; "
+                "run the models in inference workers instead"
+            )
+        self.stages = [PipelineStage(*stage) for stage in stages]
+        self.batch_wait = batch_wait
+        self.queues = [queue.Queue(queue_size) for _ in self.stages]
+        self.start_time = time.perf_counter()
+        self.threads = [
+            threading.Thread(
+                target=self._run,
+                args=(ix,),
+                name=f"pipeline-{stage.name}",
+                daemon=True,
+            )
+            for ix, stage in enumerate(self.stages)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _run(self, ix):
+        stage = self.stages[ix]
+        inbox = self.queues[ix]
+        outbox = self.queues[ix + 1] if ix + 1 < len(self.queues) else None
+
+        while batch := self._next_batch(inbox, stage.batch_size):
+            futures = [future for future, _ in batch]
+            values = [value for _, value in batch]
+            start_time = time.perf_counter()
+            try:
+                if stage.batch_size > 1:
+                    values = stage.function(values)
+                else:
+                    values = [stage.function(values[0])]
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            finally:
+                stage.record(time.perf_counter() - start_time, len(batch))
+
+            for future, value in zip(futures, values):
+                if outbox is None:
+                    future.set_result(value)
+                else:
+                    outbox.put((future, value))
+
+        if outbox is not None:
+            outbox.put(None)
+
+    def _next_batch(self, inbox, size) -> list:
+        """Take up to size items, or none once the pipeline is closed."""
+        if (item := inbox.get()) is None:
+            return []
+
+        batch = [item]
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < size:
+            try:
+                item = inbox.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if item is None:
+                # Nothing follows the end marker, so it can go back for the next call
+                inbox.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def submit(self, value) -> Future:
+        """Queue a value for processing, blocking while the first queue is full."""
+        future: Future = Future()
+        self.queues[0].put((future, value))
+        return future
+
+    def close(self):
+        """Finish processing the queued values and stop the threads."""
+        self.queues[0].put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def service_time(self) -> float:
+        """Recent seconds per item in the slowest stage.
+
+        This is how long each queued item delays the following ones,
+        while the time of a single item through the pipeline includes its wait.
+        """
+        return max(
+            (stage.item_seconds for stage in self.stages if stage.items), default=0.0
+        )
+
+    def stats(self) -> dict:
+        """The number of items and batches and the share of time each stage was busy."""
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            stage.name: {
+                "items": stage.items,
+                "batches": stage.batches,
+                "busy_seconds": stage.busy_seconds,
+                "utilization": stage.busy_seconds / elapsed,
+            }
+            for stage in self.stages
+        }
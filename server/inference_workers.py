@@ -0,0 +1,423 @@
+import argparse
+import itertools
+import os
+import pickle
+import queue
+import socket
+import socketserver
+import stat
+import struct
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process
+
+import torch
+
+from intent_classifier import load_intent_classifiers
+from model_package import ModelPackage
+from resource_stats import DEFAULT_TRACE_TOP, resource_report
+
+DEFAULT_MODEL_PATH = os.getenv("MODEL")
+DEFAULT_SOCKET_DIR = os.getenv("INFERENCE_SOCKET_DIR")
+DEFAULT_WORKERS = 2
+
+# Calls one HTTP worker process may have running in each inference worker at once
+DEFAULT_MAX_CONNECTIONS = 8
+
+# Seconds to wait for the answer to a call, and to a readiness check
+DEFAULT_CALL_TIMEOUT = 30
+READY_TIMEOUT = 2
+
+# Every message is a pickle prefixed with its length
+HEADER = struct.Struct("!I")
+
+# ModelPackage methods that can be called remotely
+REMOTE_METHODS = (
+    "info",
+    "resources",
+    "route",
+    "label_indices",
+    "classify",
+    "classify_batch",
+    "classify_within",
+)
+
+
+class WorkerUnavailable(ConnectionError):
+    """An inference worker could not be connected to or did not answer in time."""
+
+
+class WorkerBusy(Exception):
+    """All connections to an inference worker are in use."""
+
+
+def check_private_dir(path):
+    """Refuse a socket directory that other users could write to or connect in.
+
+    Anyone who can connect to the sockets can make the workers unpickle
+    arbitrary data, so the directory must belong to this user only.
+    """
+    info = os.lstat(path)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise PermissionError(
+            f"The socket directory {path} must be owned and only accessible by "
+            f"the current user"
+        )
+
+
+def send_message(sock, message):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def recv_exactly(sock, size) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise EOFError("Connection closed")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def recv_message(sock):
+    (size,) = HEADER.unpack(recv_exactly(sock, HEADER.size))
+    return pickle.loads(recv_exactly(sock, size))
+
+
+class InferenceRequestHandler(socketserver.BaseRequestHandler):
+    """Answer the calls of one HTTP worker connection until it is closed."""
+
+    def handle(self):
+        package = self.server.package
+        while True:
+            try:
+                method, args = recv_message(self.request)
+            except EOFError:
+                return
+
+            try:
+                if method == "ready":
+                    result = bool(package.ready)
+                elif method == "resource_report":
+                    result = resource_report(package, *args)
+                elif method in REMOTE_METHODS:
+                    result = getattr(package, method)(*args)
+                else:
+                    raise ValueError(f"Unknown method {method}")
+            except ValueError as e:
+                send_message(self.request, ("error", e))
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                send_message(self.request, ("error", RuntimeError(str(e))))
+            else:
+                send_message(self.request, ("ok", result))
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    """Serve the models of a package to HTTP workers over a Unix socket."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, package):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, InferenceRequestHandler)
+        self.package = package
+
+
+class WorkerConnections:
+    """A limited number of connections to one inference worker.
+
+    Idle connections are kept for reuse, and a call waits
+    while all the connections allowed are in use.
+    """
+
+    def __init__(
+        self,
+        socket_path,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        timeout=DEFAULT_CALL_TIMEOUT,
+    ):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.idle = queue.SimpleQueue()
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            check_private_dir(os.path.dirname(self.socket_path) or ".")
+            sock.connect(self.socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            sock.close()
+            raise WorkerUnavailable(f"Cannot connect to {self.socket_path}") from e
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def exchange(self, sock, message, timeout=None):
+        sock.settimeout(timeout or self.timeout)
+        try:
+            send_message(sock, message)
+            return recv_message(sock)
+        except socket.timeout as e:
+            sock.close()
+            raise WorkerUnavailable(f"No answer from {self.socket_path}") from e
+        except BaseException:
+            sock.close()
+            raise
+
+    def call(self, message, blocking=True, timeout=None):
+        """Send a message to the worker and return its response.
+
+        An idle connection closed by the worker, for example after a restart,
+        is replaced by a fresh one and the message is sent once more;
+        a message that made the worker close a fresh connection is not resent.
+        Without blocking, raises WorkerBusy if no connection is free.
+        """
+        if not self.slots.acquire(blocking):
+            raise WorkerBusy(self.socket_path)
+        try:
+            try:
+                sock = self.idle.get_nowait()
+                pooled = True
+            except queue.Empty:
+                sock = self.connect()
+                pooled = False
+
+            try:
+                response = self.exchange(sock, message, timeout)
+            except (EOFError, BrokenPipeError, ConnectionResetError):
+                if not pooled:
+                    raise
+                sock = self.connect()
+                response = self.exchange(sock, message, timeout)
+
+            self.idle.put(sock)
+            return response
+        finally:
+            self.slots.release()
+
+    def probe(self, message, timeout):
+        """Send a message on a connection of its own, without waiting for a slot."""
+        sock = self.connect()
+        try:
+            return self.exchange(sock, message, timeout)
+        finally:
+            sock.close()
+
+    def close(self):
+        """Close the idle connections."""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RemoteModelPackage:
+    """Models held by inference worker processes and reached over Unix sockets.
+
+    This offers the ModelPackage interface used by the server.
+    Calls go to the workers in turn, preferring one with a free connection
+    and skipping those that cannot be connected to or do not answer in time.
+    """
+
+    def __init__(
+        self,
+        socket_paths,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        timeout=DEFAULT_CALL_TIMEOUT,
+    ):
+        if isinstance(socket_paths, str):
+            socket_paths = [socket_paths]
+        socket_paths = [path for paths in socket_paths for path in paths.split(":")]
+        if not socket_paths:
+            raise ValueError("Please provide at least one inference socket")
+
+        self.workers = [
+            WorkerConnections(path, max_connections, timeout) for path in socket_paths
+        ]
+        self.turns = itertools.count()
+        self.label_index_maps = {}
+
+    def call(self, method, *args):
+        first = next(self.turns) % len(self.workers)
+        workers = self.workers[first:] + self.workers[:first]
+
+        # Wait for a busy worker only when none has a free connection
+        for blocking in (False, True):
+            busy = []
+            for worker in workers:
+                try:
+                    status, result = worker.call((method, args), blocking)
+                except WorkerBusy:
+                    busy.append(worker)
+                    continue
+                except WorkerUnavailable:
+                    continue
+
+                if status == "error":
+                    raise result
+                return result
+            workers = busy
+
+        raise WorkerUnavailable("No inference worker is available")
+
+    def close(self):
+        """Close the idle connections."""
+        for worker in self.workers:
+            worker.close()
+
+    @property
+    def ready(self):
+        """Whether every worker can be connected to and has its models ready."""
+        return all(self.worker_ready(worker) for worker in self.workers)
+
+    @staticmethod
+    def worker_ready(worker) -> bool:
+        # Not queued behind the calls of a busy worker
+        try:
+            return worker.probe(("ready", ()), READY_TIMEOUT) == ("ok", True)
+        except (EOFError, OSError):
+            return False
+
+    def resource_reports(self, trace_seconds=None, top=DEFAULT_TRACE_TOP) -> list:
+        """Ask every worker concurrently for the resources of its own process.
+
+        A worker that cannot be reached is reported with the error instead.
+        """
+
+        # The trace runs before the report is sent
+        timeout = DEFAULT_CALL_TIMEOUT + (trace_seconds or 0)
+
+        def report(worker):
+            message = ("resource_report", (trace_seconds, top))
+            try:
+                status, result = worker.call(message, timeout=timeout)
+            except (EOFError, OSError) as e:
+                return {"socket": worker.socket_path, "error": str(e)}
+
+            if status == "error":
+                raise result
+            return {"socket": worker.socket_path, **result}
+
+        with ThreadPoolExecutor(len(self.workers)) as executor:
+            return list(executor.map(report, self.workers))
+
+    def info(self) -> list:
+        return self.call("info")
+
+    def resources(self) -> list:
+        return self.call("resources")
+
+    def route(self, model_key=None, deadline=None):
+        return self.call("route", model_key, deadline)
+
+    def label_indices(self, ix) -> dict:
+        if ix not in self.label_index_maps:
+            self.label_index_maps[ix] = self.call("label_indices", ix)
+        return self.label_index_maps[ix]
+
+    def classify(self, data, model_key: str):
+        return self.call("classify", data, model_key)
+
+    def classify_batch(self, texts: list, model_key: str):
+        return self.call("classify_batch", texts, model_key)
+
+    def classify_within(self, data, model_key=None, deadline=None):
+        return self.call("classify_within", data, model_key, deadline)
+
+
+def serve(socket_path, model_paths, pipeline=True, torch_threads=None):
+    """Load the models and answer the HTTP workers until terminated."""
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+
+    package = ModelPackage()
+    for model in load_intent_classifiers(model_paths, pipeline):
+        package.add(model)
+
+    with InferenceServer(socket_path, package) as server:
+        server.serve_forever()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description="Run inference worker processes for the HTTP server."
+    )
+
+    arg_parser.add_argument(
+        "--model",
+        type=str,
+        default=DEFAULT_MODEL_PATH,
+        required=not DEFAULT_MODEL_PATH,
+        nargs="+",
+        help="Path to model directory or file.",
+    )
+
+    arg_parser.add_argument(
+        "--pipeline",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Overlap tokenization, inference and post-processing, "
+        "funnelling the calls of all connections into bounded queues.",
+    )
+
+    arg_parser.add_argument(
+        "--socket-dir",
+        type=str,
+        default=DEFAULT_SOCKET_DIR,
+        help="Private directory for the Unix sockets of the workers "
+        "(by default a new temporary one).",
+    )
+
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("INFERENCE_WORKERS") or DEFAULT_WORKERS),
+        help="Number of inference worker processes.",
+    )
+
+    args = arg_parser.parse_args()
+
+    # Only this user may connect, since the messages are pickles
+    if args.socket_dir:
+        os.makedirs(args.socket_dir, mode=0o700, exist_ok=True)
+        try:
+            check_private_dir(args.socket_dir)
+        except PermissionError as e:
+            arg_parser.error(str(e))
+        socket_dir = args.socket_dir
+    else:
+        socket_dir = tempfile.mkdtemp(prefix="intent-classifier-")
+
+    torch_threads = max(1, (os.cpu_count() or 1) // args.workers)
+    socket_paths = [
+        os.path.join(socket_dir, f"worker-{ix}.sock") for ix in range(args.workers)
+    ]
+
+    processes = [
+        Process(
+            target=serve,
+            args=(socket_path, args.model, args.pipeline, torch_threads),
+            daemon=True,
+        )
+        for socket_path in socket_paths
+    ]
+    for process in processes:
+        process.start()
+
+    print(f"INFERENCE_SOCKETS={':'.join(socket_paths)}", flush=True)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
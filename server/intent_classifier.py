@@ -4,11 +4,28 @@ from intent_classifier_entailment import IntentClassifierEntailmentModel
 from intent_classifier_tree import IntentClassifierTreeModel
 
 
-def load_intent_classifier(path):
+def load_intent_classifier(path, pipeline=False):
     if os.path.isdir(path):
         model = IntentClassifierEntailmentModel()
     else:
         model = IntentClassifierTreeModel()
 
     model.load(path)
+    if pipeline and isinstance(model, IntentClassifierEntailmentModel):
+        model.start_pipeline()
     return model
+
+
+def load_intent_classifiers(model_paths, pipeline=False):
+    """Load the models from a path or a list of paths.
+
+    Each path can contain several colon-separated paths.
+    """
+    if isinstance(model_paths, str):
+        model_paths = [model_paths]
+
+    return [
+        load_intent_classifier(path, pipeline)
+        for model_path in model_paths
+        for path in model_path.split(":")
+    ]
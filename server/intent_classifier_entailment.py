@@ -1,18 +1,25 @@
 import csv
 import os
+import time
 
 import torch
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
 
+from inference_pipeline import DEFAULT_QUEUE_SIZE, InferencePipeline
+
 MULTICLASS_PENALTY = 0.1
 PROB_THRESHOLD = 0.2
 TOP_N_CHOICES = 3
 
+# Utterances whose hypotheses go through the model in a single forward pass
+MAX_FORWARD_BATCH = 8
+
 
 class IntentClassifierEntailmentModel:
     def __init__(self):
         self.model_name = "Entailment (NLI) Model"
         self.model_path = None
+        self.load_time = None
 
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
@@ -23,11 +30,38 @@ class IntentClassifierEntailmentModel:
         self.multiclass_labels = None
         self.base_hypotheses = None
         self.entailment_id = None
+        self.pipeline = None
 
     def is_ready(self):
         return self.model is not None
 
+    def memory_info(self):
+        """Sizes of the model tensors and of the tokenizer.
+
+        The tokenizer size is that of its serialized form (which includes
+        the vocabulary), as the fast tokenizers keep their data outside Python.
+        """
+        if not self.is_ready():
+            return {}
+
+        if self.tokenizer.is_fast:
+            tokenizer_bytes = len(self.tokenizer.backend_tokenizer.to_str().encode())
+        else:
+            tokenizer_bytes = None
+
+        return {
+            "parameter_bytes": sum(
+                p.numel() * p.element_size() for p in self.model.parameters()
+            ),
+            "buffer_bytes": sum(
+                b.numel() * b.element_size() for b in self.model.buffers()
+            ),
+            "tokenizer_bytes": tokenizer_bytes,
+            "vocabulary_size": len(self.tokenizer),
+        }
+
     def load(self, dir_path):
+        start_time = time.perf_counter()
         self.model_path = dir_path
         base_labels_file = os.path.join(dir_path, "base_labels.tsv")
         labels_file = os.path.join(dir_path, "labels.txt")
@@ -57,23 +91,52 @@ class IntentClassifierEntailmentModel:
 
         id2labels = self.model.config.id2label.items()
         self.entailment_id = next(ix for ix, v in id2labels if v == "entailment")
-
-    def classify(self, utterance):
-        if not self.is_ready():
-            raise ValueError("Model not loaded")
-
+        self.load_time = time.perf_counter() - start_time
+
+    def start_pipeline(self, queue_size=DEFAULT_QUEUE_SIZE):
+        """Run tokenization, the forward pass and post-processing concurrently.
+
+        The utterances queued for the forward pass, whichever caller sent them,
+        go through the model together.
+        """
+        self.pipeline = InferencePipeline(
+            (
+                ("tokenize", self.tokenize),
+                ("forward", self.forward_batch, MAX_FORWARD_BATCH),
+                ("postprocess", self.postprocess),
+            ),
+            queue_size,
+        )
+
+    def tokenize(self, utterance):
         utterance = utterance.lower().replace("?", "")
 
-        inputs = self.tokenizer.batch_encode_plus(
+        return self.tokenizer.batch_encode_plus(
             [[utterance, t] for t in self.base_hypotheses],
             add_special_tokens=True,
-            padding=True,
             truncation=True,
+        )
+
+    def forward_batch(self, encodings):
+        """Hypothesis probabilities for several tokenized utterances in one pass.
+
+        The pairs of all the utterances are padded to the same length.
+        """
+        inputs = self.tokenizer.pad(
+            {
+                key: [pair for encoding in encodings for pair in encoding[key]]
+                for key in encodings[0]
+            },
+            padding=True,
             return_tensors="pt",
         ).to(self.device)
-
         logits = self.model(**inputs)["logits"][:, self.entailment_id]
-        probs = logits.softmax(dim=0).tolist()
+        return logits.view(len(encodings), -1).softmax(dim=1).tolist()
+
+    def forward(self, encoding):
+        return self.forward_batch([encoding])[0]
+
+    def postprocess(self, probs):
         assert len(probs) == len(self.base_hypotheses) == len(self.base_labels)
 
         all_probs = [
@@ -89,3 +152,22 @@ class IntentClassifierEntailmentModel:
         ]
         topn = sorted(good, reverse=True)[:TOP_N_CHOICES]
         return [label for _, label in topn]
+
+    def classify(self, utterance):
+        if not self.is_ready():
+            raise ValueError("Model not loaded")
+
+        if self.pipeline is not None:
+            return self.pipeline.submit(utterance).result()
+
+        return self.postprocess(self.forward(self.tokenize(utterance)))
+
+    def classify_batch(self, utterances):
+        if not self.is_ready():
+            raise ValueError("Model not loaded")
+
+        if self.pipeline is None:
+            return [self.classify(utterance) for utterance in utterances]
+
+        futures = [self.pipeline.submit(utterance) for utterance in utterances]
+        return [future.result() for future in futures]
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
 import pickle
+import sys
+import time
 
 from sklearn.tree import DecisionTreeClassifier
 
@@ -10,11 +12,44 @@ class IntentClassifierTreeModel:
         self.model = None
         self.model_name = "Decision Tree Classifier"
         self.model_path = None
+        self.load_time = None
+        self.pipeline = None
 
     def is_ready(self):
         return self.model is not None
 
+    @property
+    def labels(self):
+        if not self.is_ready():
+            return []
+        return [str(label) for label in self.model["tree"].classes_]
+
+    def memory_info(self):
+        """Sizes of the tree arrays and of the vocabulary list with its words."""
+        if not self.is_ready():
+            return {}
+        tree = self.model["tree"].tree_
+        words = self.model["words"]
+        return {
+            "parameter_bytes": sum(
+                array.nbytes
+                for array in (
+                    tree.children_left,
+                    tree.children_right,
+                    tree.feature,
+                    tree.threshold,
+                    tree.value,
+                    tree.impurity,
+                    tree.n_node_samples,
+                    tree.weighted_n_node_samples,
+                )
+            ),
+            "vocabulary_bytes": sys.getsizeof(words) + sum(map(sys.getsizeof, words)),
+            "vocabulary_size": len(words),
+        }
+
     def load(self, file_path):
+        start_time = time.perf_counter()
         self.model_path = file_path
 
         with open(file_path, "rb") as f:
@@ -27,6 +62,7 @@ class IntentClassifierTreeModel:
             raise ValueError("Unexpected model format") from e
 
         self.model = model
+        self.load_time = time.perf_counter() - start_time
 
     def classify(self, utterance):
         if not self.is_ready():
@@ -37,3 +73,6 @@ class IntentClassifierTreeModel:
         words = set(utterance.split(" "))
         features = [int(word in words) for word in self.model["words"]]
         return [predict([features])[0]]
+
+    def classify_batch(self, utterances):
+        return [self.classify(utterance) for utterance in utterances]
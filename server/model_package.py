@@ -1,8 +1,52 @@
+import threading
+import time
+
+# Weight of the newest measurement in the moving average of inference times
+LATENCY_SMOOTHING = 0.2
+
+
+class ModelLoad:
+    """Recent inference times and in-flight requests for a single model."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.latency = None
+
+    def start(self, count=1):
+        with self.lock:
+            self.in_flight += count
+
+    def finish(self, seconds, count=1):
+        """Record that count texts were answered, taking seconds each."""
+        with self.lock:
+            self.in_flight -= count
+            if not count:
+                return
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+
+    def estimate(self) -> float:
+        """Expected seconds until a new text is answered.
+
+        This is the queue wait for the texts already in flight
+        plus the inference time for the new one.
+        A model without measurements is assumed to answer instantly.
+        """
+        if self.latency is None:
+            return 0.0
+        return (self.in_flight + 1) * self.latency
+
+
 class ModelPackage:
     """Several models that can be requested dynamically."""
 
     def __init__(self):
         self.models = []
+        self.loads = []
+        self.label_index_maps = {}
 
     @property
     def ready(self):
@@ -10,13 +54,38 @@ class ModelPackage:
 
     def add(self, model):
         self.models.append(model)
+        self.loads.append(ModelLoad())
 
     def info(self) -> list:
         return [
-            {"key": str(ix), "name": model.model_name, "path": model.model_path}
+            {
+                "key": str(ix),
+                "name": model.model_name,
+                "path": model.model_path,
+                "labels": list(model.labels or []),
+            }
             for ix, model in enumerate(self.models)
         ]
 
+    def resources(self) -> list:
+        return [
+            {
+                "key": str(ix),
+                "name": model.model_name,
+                "load_time": model.load_time,
+                **model.memory_info(),
+                **({"pipeline": model.pipeline.stats()} if model.pipeline else {}),
+            }
+            for ix, model in enumerate(self.models)
+        ]
+
+    def label_indices(self, ix) -> dict:
+        """Map the labels of a model to their positions in its info labels list."""
+        if ix not in self.label_index_maps:
+            labels = self.models[ix].labels
+            self.label_index_maps[ix] = {label: jx for jx, label in enumerate(labels)}
+        return self.label_index_maps[ix]
+
     def model_index(self, key=None):
         """Find a model by a key which could be an index, name or path.
 
@@ -44,17 +113,100 @@ class ModelPackage:
         except StopIteration:
             return None
 
-    def classify(self, data, model_key: str):
-        """Forward the classification task to the appropriate model.
+    def route(self, model_key=None, deadline=None):
+        """Choose the index of the model that should answer a request.
 
-        This checks that the requested model exists and is ready.
+        Without a deadline (in seconds) this is the requested model.
+        If the requested model is not ready or not expected to answer in time,
+        the first ready model in the list that is expected to do so is chosen;
+        when none is, the ready one with the smallest expected time is chosen.
         """
         ix = self.model_index(model_key)
         if ix is None:
             raise ValueError(f"No model found for {model_key}")
 
+        if deadline is None:
+            return ix
+
+        if self.models[ix].is_ready() and self.loads[ix].estimate() <= deadline:
+            return ix
+
+        estimates = [
+            (load.estimate(), jx)
+            for jx, (model, load) in enumerate(zip(self.models, self.loads))
+            if model.is_ready()
+        ]
+        if not estimates:
+            return ix
+
+        try:
+            return next(jx for estimate, jx in estimates if estimate <= deadline)
+        except StopIteration:
+            return min(estimates)[1]
+
+    def ready_model(self, model_key):
+        """Find a model together with its load, checking that it is ready."""
+        ix = self.model_index(model_key)
+        if ix is None:
+            raise ValueError(f"No model found for {model_key}")
+
         model = self.models[ix]
         if not model.is_ready():
             raise ValueError(f"The specified model {model_key} was not ready")
 
-        return self.models[ix].classify(data)
+        return model, self.loads[ix]
+
+    @staticmethod
+    def answer(model, load, data, batch=False):
+        """Classify a text, or a list of texts as a batch, recording the time per text.
+
+        The texts are added to the load of the model by the caller.
+        The recorded time is the time a text spends in service: for pipelined
+        models it excludes the wait in the pipeline queues.
+        """
+        count = len(data) if batch else 1
+        start_time = time.perf_counter()
+        try:
+            return model.classify_batch(data) if batch else model.classify(data)
+        finally:
+            if model.pipeline:
+                service_time = model.pipeline.service_time()
+            else:
+                service_time = (time.perf_counter() - start_time) / max(count, 1)
+            load.finish(service_time, count)
+
+    def classify(self, data, model_key: str):
+        """Forward the classification task to the appropriate model.
+
+        This checks that the requested model exists and is ready,
+        and records the time the model took to answer.
+        """
+        model, load = self.ready_model(model_key)
+        load.start()
+        return self.answer(model, load, data)
+
+    def classify_batch(self, texts: list, model_key: str):
+        """Forward several classification tasks to the appropriate model at once.
+
+        Pipelined models can then work on several texts concurrently.
+        """
+        model, load = self.ready_model(model_key)
+        load.start(len(texts))
+        return self.answer(model, load, texts, batch=True)
+
+    def classify_within(self, data, model_key=None, deadline=None):
+        """Route a text or a list of texts to a model and classify them.
+
+        The texts count towards the load of the chosen model from then on.
+        Returns the index of the model together with its answer.
+        """
+        ix = self.route(model_key, deadline)
+        model, load = self.ready_model(ix)
+        batch = isinstance(data, list)
+
+        load.start(len(data) if batch else 1)
+        # Under gevent a running model never yields, so the requests queued
+        # behind this one get to be routed (and counted) before it starts
+        time.sleep(0)
+
+        return ix, self.answer(model, load, data, batch)
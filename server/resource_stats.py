@@ -0,0 +1,96 @@
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import torch
+
+START_TIME = time.time()
+STARTUP_RSS_BYTES = None
+
+# Number of frames stored for each traced allocation
+TRACE_FRAMES = 5
+DEFAULT_TRACE_TOP = 10
+TRACE_LOCK = threading.Lock()
+
+
+def rss_bytes():
+    """Current resident set size of the process, or None if it is unavailable."""
+    try:
+        with open("/proc/self/statm", "rt", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_bytes():
+    """Peak resident set size of the process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes while macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def record_startup():
+    """Remember the resident set size once the models are loaded."""
+    global STARTUP_RSS_BYTES  # pylint: disable=global-statement
+    STARTUP_RSS_BYTES = rss_bytes()
+
+
+def process_info() -> dict:
+    return {
+        "pid": os.getpid(),
+        "uptime": time.time() - START_TIME,
+        "rss_bytes": rss_bytes(),
+        "startup_rss_bytes": STARTUP_RSS_BYTES,
+        "peak_rss_bytes": peak_rss_bytes(),
+        "torch_threads": torch.get_num_threads(),
+        "torch_interop_threads": torch.get_num_interop_threads(),
+        "gc_counts": gc.get_count(),
+        "gc_stats": gc.get_stats(),
+    }
+
+
+def trace_allocations(seconds, limit=DEFAULT_TRACE_TOP) -> list:
+    """Trace memory allocations during a time window.
+
+    Returns the top allocation sites of the memory that was allocated
+    during the window and is still held at its end.
+    Raises RuntimeError if allocations are already being traced.
+    """
+    if tracemalloc.is_tracing() or not TRACE_LOCK.acquire(blocking=False):
+        raise RuntimeError("Allocations are already being traced")
+
+    try:
+        tracemalloc.start(TRACE_FRAMES)
+        time.sleep(seconds)
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        TRACE_LOCK.release()
+
+    snapshot = snapshot.filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),)
+    )
+    return [
+        {
+            "size": stat.size,
+            "count": stat.count,
+            "traceback": stat.traceback.format(),
+        }
+        for stat in snapshot.statistics("traceback")[:limit]
+    ]
+
+
+def resource_report(package, trace_seconds=None, top=DEFAULT_TRACE_TOP) -> dict:
+    """Resources used by the models of a package and by this process.
+
+    With trace_seconds, the top allocation sites during that window are included.
+    """
+    report = {"models": package.resources()}
+    if trace_seconds is not None:
+        report["allocations"] = trace_allocations(trace_seconds, top)
+    report["process"] = process_info()
+    return report
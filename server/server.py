@@ -1,12 +1,24 @@
 import argparse
+import math
 import os
+import time
 
-from flask import Blueprint, Flask, jsonify, request
+import msgpack
+from flask import Blueprint, Flask, Response, g, jsonify, request
 
-from intent_classifier import load_intent_classifier
+from inference_workers import RemoteModelPackage
+from intent_classifier import load_intent_classifiers
 from model_package import ModelPackage
+from resource_stats import (
+    DEFAULT_TRACE_TOP,
+    process_info,
+    record_startup,
+    resource_report,
+)
 
 DEFAULT_MODEL_PATH = os.getenv("MODEL")
+DEFAULT_PIPELINE = bool(os.getenv("PIPELINE"))
+DEFAULT_INFERENCE_SOCKETS = os.getenv("INFERENCE_SOCKETS")
 try:
     from _version import VERSION
 except ImportError:
@@ -16,6 +28,96 @@ except ImportError:
 api = Blueprint("main", __name__)
 models = ModelPackage()
 
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack")
+MAX_TRACE_SECONDS = 60
+
+
+def decode_body():
+    """Decode the request body from MessagePack or JSON.
+
+    Returns None if the body is missing or can't be decoded.
+    """
+    if request.mimetype in MSGPACK_MIMETYPES:
+        try:
+            return msgpack.unpackb(request.get_data(), raw=False)
+        except (TypeError, ValueError):
+            return None
+
+    if request.is_json:
+        return request.get_json()
+
+    return None
+
+
+def read_body():
+    """Decode the request body, recording the CPU time of the decoding."""
+    # Receive the whole body first so that only the decoding is timed
+    request.get_data()
+    start_time = time.thread_time()
+    try:
+        return decode_body()
+    finally:
+        g.timings["decode"] = time.thread_time() - start_time
+
+
+def respond(payload, status=200):
+    """Encode the response in the format preferred by the client.
+
+    This is JSON unless the Accept header prefers one of the MessagePack types.
+    The CPU time of the encoding is recorded.
+    """
+    start_time = time.thread_time()
+    mimetype = request.accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES)
+    if mimetype in MSGPACK_MIMETYPES:
+        response = Response(msgpack.packb(payload), status=status, mimetype=mimetype)
+    else:
+        response = jsonify(payload)
+        response.status_code = status
+    g.timings["encode"] = time.thread_time() - start_time
+    return response
+
+
+def remaining_seconds(deadline_ms):
+    """The part of the time budget left after the request waited in queues.
+
+    The wait is known when the client or a proxy in front of the service
+    sets the X-Request-Start header to the time the request was sent or received
+    (as "t=<time since the epoch>" in seconds, milliseconds or microseconds).
+    """
+    budget = deadline_ms / 1000
+    try:
+        start = float(request.headers.get("X-Request-Start", "").removeprefix("t="))
+    except ValueError:
+        return budget
+    if not math.isfinite(start):
+        return budget
+
+    while start > 1e11:
+        start /= 1000
+    return budget - max(0.0, time.time() - start)
+
+
+def encode_intents(labels, label_indices=None):
+    """Intents as label objects, or as indices into the model's labels list."""
+    if label_indices is None:
+        return [{"label": label} for label in labels]
+    return [label_indices[label] for label in labels]
+
+
+@api.before_request
+def start_timing():
+    g.timings = {}
+
+
+@api.after_request
+def add_timing(response):
+    if g.timings:
+        response.headers["Server-Timing"] = ", ".join(
+            f"{name};dur={1000 * seconds:.3f}" for name, seconds in g.timings.items()
+        )
+    return response
+
 
 @api.route("/ready")
 def ready():
@@ -26,7 +128,7 @@ def ready():
 
 @api.route("/info")
 def info():
-    return jsonify(
+    return respond(
         {
             "models": models.info(),
             "ready": models.ready,
@@ -35,40 +137,99 @@ def info():
     )
 
 
+@api.route("/resources")
+def resources():
+    trace_seconds = request.args.get("trace", type=float)
+    if "trace" in request.args and not (
+        trace_seconds is not None and 0 < trace_seconds <= MAX_TRACE_SECONDS
+    ):
+        return respond(
+            {
+                "label": "TRACE_INVALID",
+                "message": f'"trace" must be between 0 and {MAX_TRACE_SECONDS}.',
+            },
+            400,
+        )
+
+    top = request.args.get("top", type=int)
+    if "top" in request.args and (top is None or top <= 0):
+        return respond(
+            {
+                "label": "TRACE_INVALID",
+                "message": '"top" must be a positive integer.',
+            },
+            400,
+        )
+    top = top or DEFAULT_TRACE_TOP
+
+    try:
+        # The models of inference workers live in their own processes
+        if isinstance(models, RemoteModelPackage):
+            result = {
+                "workers": models.resource_reports(trace_seconds, top),
+                "process": process_info(),
+            }
+        else:
+            result = resource_report(models, trace_seconds, top)
+    except RuntimeError as e:
+        return respond({"label": "TRACE_BUSY", "message": str(e)}, 409)
+
+    return respond(result)
+
+
 @api.route("/intent", methods=["POST"])
 def intent():
-    if not request.is_json:
-        return (
-            jsonify(
-                {
-                    "label": "BODY_MISSING",
-                    "message": "Request doesn't have a body.",
-                }
-            ),
+    data = read_body()
+    if data is None:
+        return respond(
+            {
+                "label": "BODY_MISSING",
+                "message": "Request doesn't have a body.",
+            },
             400,
         )
 
-    data = request.get_json()
     if not isinstance(data, dict) or "text" not in data:
-        return (
-            jsonify(
-                {
-                    "label": "TEXT_MISSING",
-                    "message": '"text" missing from request body.',
-                }
-            ),
+        return respond(
+            {
+                "label": "TEXT_MISSING",
+                "message": '"text" missing from request body.',
+            },
+            400,
+        )
+
+    deadline_ms = data.get("deadline_ms")
+    if deadline_ms is not None and (
+        isinstance(deadline_ms, bool)
+        or not isinstance(deadline_ms, (int, float))
+        # Also false for NaN, which JSON and MessagePack both allow
+        or not 0 < deadline_ms < math.inf
+    ):
+        return respond(
+            {
+                "label": "DEADLINE_INVALID",
+                "message": '"deadline_ms" must be a positive finite number.',
+            },
             400,
         )
 
     try:
-        intents = models.classify(data["text"], data.get("requested_model"))
-        return (
-            jsonify(
-                {
-                    "intents": [{"label": label} for label in intents],
-                }
-            ),
-            200,
+        deadline = None if deadline_ms is None else remaining_seconds(deadline_ms)
+        ix, answer = models.classify_within(
+            data["text"], data.get("requested_model"), deadline
+        )
+
+        label_indices = models.label_indices(ix) if data.get("label_indices") else None
+        if isinstance(data["text"], list):
+            intents = [encode_intents(labels, label_indices) for labels in answer]
+        else:
+            intents = encode_intents(answer, label_indices)
+
+        return respond(
+            {
+                "intents": intents,
+                "model": str(ix),
+            }
         )
     # except ValueError as e:
     #     return (
@@ -81,18 +242,20 @@ def intent():
     #         400,
     #     )
     except Exception as e:
-        return (
-            jsonify(
-                {
-                    "label": "INTERNAL_ERROR",
-                    "message": f"Something went wrong: {e}",
-                }
-            ),
+        return respond(
+            {
+                "label": "INTERNAL_ERROR",
+                "message": f"Something went wrong: {e}",
+            },
             500,
         )
 
 
-def create_app(model_paths=DEFAULT_MODEL_PATH):
+def create_app(
+    model_paths=DEFAULT_MODEL_PATH,
+    pipeline=DEFAULT_PIPELINE,
+    inference_sockets=DEFAULT_INFERENCE_SOCKETS,
+):
     """
     Function to create a Flask app by loading the models specified.
 
@@ -100,22 +263,30 @@ def create_app(model_paths=DEFAULT_MODEL_PATH):
     This parameter can be a string or a list of strings;
     each string can contain several semicolon-separated paths.
     Default is DEFAULT_MODEL_PATH.
+    :param pipeline: Whether to run the stages of the entailment models
+    on separate threads. Default is DEFAULT_PIPELINE.
+    :param inference_sockets: Unix sockets of inference worker processes.
+    This parameter can be a string of colon-separated paths or a list of paths.
+    When given, the models are not loaded and requests are forwarded to the workers.
+    Default is DEFAULT_INFERENCE_SOCKETS.
     :return: The Flask app object.
-    :raises ValueError: If model_paths is not provided or is empty.
+    :raises ValueError: If neither model_paths nor inference_sockets is provided.
     """
-    if not model_paths:
+    global models  # pylint: disable=global-statement
+
+    if not model_paths and not inference_sockets:
         raise ValueError("Please provide model path as a MODEL environment variable")
 
     app = Flask(__name__)
     app.register_blueprint(api)
 
-    if isinstance(model_paths, str):
-        model_paths = [model_paths]
-
-    for model_path in model_paths:
-        for model_path_split in model_path.split(":"):
-            models.add(load_intent_classifier(model_path_split))
+    if inference_sockets:
+        models = RemoteModelPackage(inference_sockets)
+    else:
+        for model in load_intent_classifiers(model_paths, pipeline):
+            models.add(model)
 
+    record_startup()
     return app
 
 
@@ -126,11 +297,25 @@ def main():
         "--model",
         type=str,
         default=DEFAULT_MODEL_PATH,
-        required=not DEFAULT_MODEL_PATH,
         nargs="+",
         help="Path to model directory or file.",
     )
 
+    arg_parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        default=DEFAULT_PIPELINE,
+        help="Overlap tokenization, inference and post-processing.",
+    )
+
+    arg_parser.add_argument(
+        "--inference-socket",
+        type=str,
+        default=DEFAULT_INFERENCE_SOCKETS,
+        nargs="+",
+        help="Unix socket of an inference worker to forward requests to.",
+    )
+
     arg_parser.add_argument(
         "--port",
         type=int,
@@ -139,7 +324,10 @@ def main():
     )
 
     args = arg_parser.parse_args()
-    app = create_app(args.model)
+    if not args.model and not args.inference_socket:
+        arg_parser.error("either --model or --inference-socket is required")
+
+    app = create_app(args.model, args.pipeline, args.inference_socket)
     app.run(port=args.port)
 
 
@@ -0,0 +1,105 @@
+import sys
+import threading
+from types import SimpleNamespace
+from unittest import TestCase, main
+from unittest.mock import patch
+
+from inference_pipeline import InferencePipeline
+
+
+class TestInferencePipeline(TestCase):
+    def setUp(self):
+        self.threads = {}
+
+        def stage(name, function):
+            def run(value):
+                self.threads[name] = threading.current_thread()
+                return function(value)
+
+            return name, run
+
+        self.pipeline = InferencePipeline(
+            (
+                stage("parse", int),
+                stage("square", lambda x: x * x),
+                stage("format", str),
+            ),
+            queue_size=2,
+        )
+
+    def tearDown(self):
+        self.pipeline.close()
+
+    def test_results_in_order(self):
+        futures = [self.pipeline.submit(str(n)) for n in range(10)]
+        self.assertEqual([f.result() for f in futures], [str(n * n) for n in range(10)])
+
+    def test_stages_on_separate_threads(self):
+        self.pipeline.submit("2").result()
+        self.assertEqual(len(set(self.threads.values())), 3)
+        self.assertNotIn(threading.current_thread(), self.threads.values())
+
+    def test_exception(self):
+        future = self.pipeline.submit("not a number")
+        self.assertRaises(ValueError, future.result)
+        self.assertEqual(self.pipeline.submit("3").result(), "9")
+
+    def test_stats(self):
+        for n in range(5):
+            self.pipeline.submit(str(n)).result()
+
+        stats = self.pipeline.stats()
+        self.assertEqual(list(stats), ["parse", "square", "format"])
+        for stage_stats in stats.values():
+            self.assertEqual(stage_stats["items"], 5)
+            self.assertGreaterEqual(stage_stats["utilization"], 0)
+            self.assertLessEqual(stage_stats["utilization"], 1)
+
+    def test_service_time(self):
+        self.assertEqual(self.pipeline.service_time(), 0.0)
+        self.pipeline.submit("4").result()
+
+        service_time = self.pipeline.service_time()
+        self.assertGreater(service_time, 0)
+        self.assertEqual(
+            service_time, max(stage.item_seconds for stage in self.pipeline.stages)
+        )
+
+    def test_batched_stage(self):
+        batch_sizes = []
+
+        def square_all(values):
+            batch_sizes.append(len(values))
+            return [value * value for value in values]
+
+        pipeline = InferencePipeline(
+            (("parse", int), ("square", square_all, 4)), batch_wait=0.2
+        )
+        self.addCleanup(pipeline.close)
+
+        futures = [pipeline.submit(str(n)) for n in range(4)]
+        self.assertEqual([f.result() for f in futures], [0, 1, 4, 9])
+        self.assertEqual(batch_sizes, [4])
+        self.assertEqual(pipeline.stats()["square"]["batches"], 1)
+        self.assertEqual(pipeline.stats()["square"]["items"], 4)
+
+        futures = [pipeline.submit(n) for n in ("5", "x")]
+        self.assertEqual(futures[0].result(), 25)
+        self.assertRaises(ValueError, futures[1].result)
+
+    def test_batched_stage_exception(self):
+        pipeline = InferencePipeline((("fail", lambda values: 1 / 0, 4),))
+        self.addCleanup(pipeline.close)
+        futures = [pipeline.submit(n) for n in range(3)]
+        for future in futures:
+            self.assertRaises(ZeroDivisionError, future.result)
+
+    def test_refused_under_gevent(self):
+        monkey = SimpleNamespace(is_module_patched=lambda name: name == "threading")
+        gevent = SimpleNamespace(monkey=monkey)
+        with patch.dict(sys.modules, {"gevent": gevent, "gevent.monkey": monkey}):
+            self.assertRaises(RuntimeError, InferencePipeline, (("parse", int),))
+
+
+if __name__ == "__main__":
+    main()
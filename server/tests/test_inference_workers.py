@@ -0,0 +1,130 @@
+import os
+import socket
+import tempfile
+import threading
+from unittest import TestCase, main
+from unittest.mock import Mock, patch
+
+from inference_workers import InferenceServer, RemoteModelPackage
+from model_package import ModelPackage
+
+
+class TestInferenceWorkers(TestCase):
+    def setUp(self):
+        test_model = Mock()
+        test_model.is_ready.return_value = True
+        test_model.classify.return_value = ["flight"]
+        test_model.classify_batch.return_value = [["flight"], ["airfare"]]
+        test_model.model_name = "Test Model"
+        test_model.model_path = "/path/to/model"
+        test_model.labels = ["flight", "airfare"]
+        test_model.pipeline = None
+        self.test_model = test_model
+
+        package = ModelPackage()
+        package.add(test_model)
+
+        self.socket_dir = tempfile.TemporaryDirectory()
+        self.socket_path = os.path.join(self.socket_dir.name, "worker-0.sock")
+        self.server = InferenceServer(self.socket_path, package)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.remote = RemoteModelPackage(self.socket_path)
+
+    def tearDown(self):
+        self.remote.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.socket_dir.cleanup()
+
+    def test_ready(self):
+        self.assertTrue(self.remote.ready)
+        self.test_model.is_ready.return_value = False
+        self.assertFalse(self.remote.ready)
+
+    def test_not_ready_without_workers(self):
+        remote = RemoteModelPackage(os.path.join(self.socket_dir.name, "missing.sock"))
+        self.assertFalse(remote.ready)
+
+    def test_failover(self):
+        missing_path = os.path.join(self.socket_dir.name, "missing.sock")
+        remote = RemoteModelPackage([missing_path, self.socket_path])
+        self.addCleanup(remote.close)
+
+        self.assertFalse(remote.ready)
+        for _ in range(2):
+            self.assertEqual(remote.classify("text", 0), ["flight"])
+
+    def test_hung_worker_skipped(self):
+        hung_path = os.path.join(self.socket_dir.name, "hung.sock")
+        hung = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(hung.close)
+        hung.bind(hung_path)
+        hung.listen()
+
+        remote = RemoteModelPackage([hung_path, self.socket_path], timeout=0.1)
+        self.addCleanup(remote.close)
+        self.assertEqual(remote.classify("text", 0), ["flight"])
+        with patch("inference_workers.READY_TIMEOUT", 0.1):
+            self.assertFalse(remote.ready)
+
+    def test_ready_while_busy(self):
+        remote = RemoteModelPackage(self.socket_path, max_connections=1)
+        self.addCleanup(remote.close)
+        with remote.workers[0].slots:
+            self.assertTrue(remote.ready)
+
+    def test_crash_not_resent(self):
+        self.test_model.classify.side_effect = SystemExit
+        self.assertRaises(EOFError, self.remote.classify, "text", 0)
+        self.assertEqual(self.test_model.classify.call_count, 1)
+
+    def test_stale_connection_replaced(self):
+        self.remote.classify("text", 0)
+        worker = self.remote.workers[0]
+        stale = worker.idle.get_nowait()
+        stale.shutdown(socket.SHUT_RDWR)
+        worker.idle.put(stale)
+
+        self.assertEqual(self.remote.classify("text", 0), ["flight"])
+
+    def test_shared_socket_dir_refused(self):
+        os.chmod(self.socket_dir.name, 0o755)
+        self.assertRaises(PermissionError, self.remote.classify, "text", 0)
+        self.assertFalse(self.remote.ready)
+
+    def test_info(self):
+        self.assertEqual(self.remote.info()[0]["name"], "Test Model")
+        self.assertEqual(self.remote.label_indices(0), {"flight": 0, "airfare": 1})
+
+    def test_classify(self):
+        self.assertEqual(self.remote.route(None, 1.0), 0)
+        self.assertEqual(self.remote.classify("text", 0), ["flight"])
+        self.assertEqual(
+            self.remote.classify_batch(["a", "b"], 0), [["flight"], ["airfare"]]
+        )
+
+    def test_errors(self):
+        self.assertRaises(ValueError, self.remote.classify, "text", "Unknown Model")
+        self.assertRaises(ValueError, self.remote.call, "add", None)
+
+        self.test_model.classify.side_effect = KeyError("broken")
+        self.assertRaises(RuntimeError, self.remote.classify, "text", 0)
+
+    def test_connections_reused(self):
+        for _ in range(3):
+            self.remote.classify("text", 0)
+        self.assertEqual(self.remote.workers[0].idle.qsize(), 1)
+
+    def test_resource_reports(self):
+        self.test_model.load_time = 1.5
+        self.test_model.memory_info.return_value = {"parameter_bytes": 1024}
+
+        (report,) = self.remote.resource_reports()
+        self.assertEqual(report["socket"], self.socket_path)
+        self.assertEqual(report["models"][0]["parameter_bytes"], 1024)
+        self.assertEqual(report["process"]["pid"], os.getpid())
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,11 @@ class TestIntentClassifierWithoutModel(unittest.TestCase):
             with self.assertRaises(FileNotFoundError):
                 classifier.load("invalid_path")
 
+    def test_memory_info_without_model(self):
+        for classifier in self.classifiers:
+            self.assertEqual(classifier.memory_info(), {})
+            self.assertIsNone(classifier.load_time)
+
     def test_classify_without_model(self):
         for classifier in self.classifiers:
             with self.assertRaises(ValueError):
@@ -34,10 +39,8 @@ class TestIntentClassifierWithoutModel(unittest.TestCase):
 
 class TestIntentClassifierWithModel(unittest.TestCase):
     def setUp(self):
-        models = os.listdir(MODELS_DIR)
-        self.classifiers = [
-            load_intent_classifier(os.path.join(MODELS_DIR, model)) for model in models
-        ]
+        self.model_paths = [os.path.join(MODELS_DIR, m) for m in os.listdir(MODELS_DIR)]
+        self.classifiers = [load_intent_classifier(path) for path in self.model_paths]
 
     def test_has_models(self):
         self.assertTrue(self.classifiers)
@@ -46,6 +49,17 @@ class TestIntentClassifierWithModel(unittest.TestCase):
         for classifier in self.classifiers:
             self.assertEqual(classifier.is_ready(), True)
 
+    def test_memory_info_with_model(self):
+        for classifier in self.classifiers:
+            memory_info = classifier.memory_info()
+            self.assertGreater(memory_info["parameter_bytes"], 0)
+            self.assertGreater(memory_info["vocabulary_size"], 0)
+            if isinstance(classifier, IntentClassifierEntailmentModel):
+                self.assertGreater(memory_info["tokenizer_bytes"], 0)
+            else:
+                self.assertGreater(memory_info["vocabulary_bytes"], 0)
+            self.assertGreater(classifier.load_time, 0)
+
     def test_classify_with_model(self):
         for classifier in self.classifiers:
             self.assertEqual(
@@ -55,6 +69,36 @@ class TestIntentClassifierWithModel(unittest.TestCase):
                 "flight",
             )
 
+    def test_classify_batch_with_pipeline(self):
+        utterances = [
+            "what are the flights from san francisco to denver",
+            "how much is a ticket to boston",
+            "which airlines fly to dallas",
+        ]
+        for path, classifier in zip(self.model_paths, self.classifiers):
+            pipelined = load_intent_classifier(path, pipeline=True)
+            self.assertEqual(
+                pipelined.classify_batch(utterances),
+                [classifier.classify(utterance) for utterance in utterances],
+            )
+            if pipelined.pipeline:
+                pipelined.pipeline.close()
+
+    def test_forward_batch(self):
+        utterances = [
+            "what are the flights from san francisco to denver",
+            "fares to boston",
+        ]
+        for classifier in self.classifiers:
+            if not isinstance(classifier, IntentClassifierEntailmentModel):
+                continue
+            encodings = [classifier.tokenize(utterance) for utterance in utterances]
+            for batch_probs, encoding in zip(
+                classifier.forward_batch(encodings), encodings
+            ):
+                for batch_prob, prob in zip(batch_probs, classifier.forward(encoding)):
+                    self.assertAlmostEqual(batch_prob, prob, places=4)
+
 
 if __name__ == "__main__":
     unittest.main()
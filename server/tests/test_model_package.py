@@ -32,11 +32,51 @@ class TestModel(TestCase):
         test_model.is_ready.return_value = True
         test_model.model_name = "Test Model"
         test_model.model_path = "/path/to/model"
+        test_model.labels = ["flight", "airfare"]
         self.model_package.add(test_model)
 
-        expected_info = [{"key": "0", "name": "Test Model", "path": "/path/to/model"}]
+        expected_info = [
+            {
+                "key": "0",
+                "name": "Test Model",
+                "path": "/path/to/model",
+                "labels": ["flight", "airfare"],
+            }
+        ]
         self.assertEqual(self.model_package.info(), expected_info)
 
+    def test_model_resources(self):
+        test_model = Mock()
+        test_model.model_name = "Test Model"
+        test_model.load_time = 1.5
+        test_model.memory_info.return_value = {"parameter_bytes": 1024}
+        test_model.pipeline = None
+        self.model_package.add(test_model)
+
+        expected_resources = [
+            {
+                "key": "0",
+                "name": "Test Model",
+                "load_time": 1.5,
+                "parameter_bytes": 1024,
+            }
+        ]
+        self.assertEqual(self.model_package.resources(), expected_resources)
+
+        test_model.pipeline = Mock()
+        test_model.pipeline.stats.return_value = {"forward": {"items": 0}}
+        expected_resources[0]["pipeline"] = {"forward": {"items": 0}}
+        self.assertEqual(self.model_package.resources(), expected_resources)
+
+    def test_model_label_indices(self):
+        test_model = Mock()
+        test_model.labels = ["flight", "airfare", "flight+airfare"]
+        self.model_package.add(test_model)
+
+        label_indices = self.model_package.label_indices(0)
+        self.assertEqual(label_indices["flight"], 0)
+        self.assertEqual(label_indices["flight+airfare"], 2)
+
     def test_model_index_by_key(self):
         self.assertEqual(self.model_package.model_index(None), None)
         self.assertEqual(self.model_package.model_index(0), None)
@@ -69,6 +109,7 @@ class TestModel(TestCase):
         test_model = Mock()
         test_model.is_ready.return_value = True
         test_model.classify.return_value = "answer"
+        test_model.pipeline = None
         test_model.model_name = "Test Model"
         test_model.model_path = "/path/to/model"
         self.model_package.add(test_model)
@@ -82,6 +123,108 @@ class TestModel(TestCase):
             model_key="Unknown Model",
         )
 
+    def test_model_classify_records_latency(self):
+        test_model = Mock()
+        test_model.is_ready.return_value = True
+        test_model.classify.return_value = "answer"
+        test_model.pipeline = None
+        self.model_package.add(test_model)
+
+        load = self.model_package.loads[0]
+        self.assertEqual(load.estimate(), 0.0)
+        self.model_package.classify([1, 2, 3], 0)
+        self.assertEqual(load.in_flight, 0)
+        self.assertIsNotNone(load.latency)
+
+    def test_model_classify_batch(self):
+        test_model = Mock()
+        test_model.is_ready.return_value = True
+        test_model.classify_batch.return_value = ["answer", "answer"]
+        test_model.pipeline = None
+        self.model_package.add(test_model)
+
+        load = self.model_package.loads[0]
+        in_flight = []
+        test_model.classify_batch.side_effect = lambda texts: (
+            in_flight.append(load.in_flight) or ["answer", "answer"]
+        )
+
+        self.assertEqual(
+            self.model_package.classify_batch(["a", "b"], "0"), ["answer", "answer"]
+        )
+        test_model.classify_batch.assert_called_once_with(["a", "b"])
+        self.assertEqual(in_flight, [2])
+        self.assertEqual(load.in_flight, 0)
+        self.assertIsNotNone(load.latency)
+
+    def test_model_classify_pipelined(self):
+        test_model = Mock()
+        test_model.is_ready.return_value = True
+        test_model.classify.return_value = ["flight"]
+        test_model.pipeline.service_time.return_value = 0.05
+        self.model_package.add(test_model)
+
+        # The time through the pipeline includes its queues, so it isn't recorded
+        self.model_package.classify("a", 0)
+        self.assertEqual(self.model_package.loads[0].latency, 0.05)
+
+    def test_model_route(self):
+        self.assertRaises(ValueError, self.model_package.route, "Unknown Model")
+
+        slow_model = Mock()
+        slow_model.is_ready.return_value = True
+        slow_model.model_name = "Slow Model"
+        self.model_package.add(slow_model)
+
+        fast_model = Mock()
+        fast_model.is_ready.return_value = True
+        fast_model.model_name = "Fast Model"
+        self.model_package.add(fast_model)
+
+        slow_load, fast_load = self.model_package.loads
+        for load, seconds in ((slow_load, 0.5), (fast_load, 0.01)):
+            load.start()
+            load.finish(seconds)
+
+        self.assertEqual(self.model_package.route(None), 0)
+        self.assertEqual(self.model_package.route(None, 1.0), 0)
+        self.assertEqual(self.model_package.route(None, 0.1), 1)
+        self.assertEqual(self.model_package.route("Fast Model", 0.1), 1)
+
+        # Queued requests count towards the expected time
+        slow_load.start()
+        self.assertEqual(self.model_package.route(None, 0.75), 1)
+
+        # Nothing meets the deadline, so the fastest model answers
+        self.assertEqual(self.model_package.route(None, 0.001), 1)
+
+        fast_model.is_ready.return_value = False
+        self.assertEqual(self.model_package.route(None, 0.1), 0)
+
+        # A requested model that isn't ready falls back to a ready one
+        fast_model.is_ready.return_value = True
+        slow_model.is_ready.return_value = False
+        self.assertEqual(self.model_package.route(None, 10.0), 1)
+
+    def test_model_classify_within(self):
+        test_model = Mock()
+        test_model.is_ready.return_value = True
+        test_model.classify.return_value = ["flight"]
+        test_model.classify_batch.return_value = [["flight"], ["airfare"]]
+        test_model.pipeline = None
+        self.model_package.add(test_model)
+
+        self.assertEqual(self.model_package.classify_within("a"), (0, ["flight"]))
+        self.assertEqual(
+            self.model_package.classify_within(["a", "b"], "0", 1.0),
+            (0, [["flight"], ["airfare"]]),
+        )
+        self.assertEqual(self.model_package.loads[0].in_flight, 0)
+        self.assertIsNotNone(self.model_package.loads[0].latency)
+
+        test_model.is_ready.return_value = False
+        self.assertRaises(ValueError, self.model_package.classify_within, "a")
+
 
 if __name__ == "__main__":
     main()
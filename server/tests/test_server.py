@@ -0,0 +1,160 @@
+from unittest import TestCase, main
+from unittest.mock import Mock
+
+import msgpack
+from flask import Flask
+
+import server
+from model_package import ModelPackage
+
+
+class TestServer(TestCase):
+    def setUp(self):
+        test_model = Mock()
+        test_model.is_ready.return_value = True
+        test_model.classify.return_value = ["airfare", "flight"]
+        test_model.classify_batch.return_value = [["flight"], ["airfare"]]
+        test_model.model_name = "Test Model"
+        test_model.model_path = "/path/to/model"
+        test_model.labels = ["flight", "airfare"]
+        test_model.pipeline = None
+
+        self.addCleanup(setattr, server, "models", server.models)
+        server.models = ModelPackage()
+        server.models.add(test_model)
+
+        app = Flask(__name__)
+        app.register_blueprint(server.api)
+        self.client = app.test_client()
+
+    def test_intent_json(self):
+        response = self.client.post("/intent", json={"text": "some text"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/json")
+        self.assertEqual(
+            response.json,
+            {"intents": [{"label": "airfare"}, {"label": "flight"}], "model": "0"},
+        )
+
+    def test_intent_msgpack(self):
+        response = self.client.post(
+            "/intent",
+            data=msgpack.packb({"text": ["one", "two"]}),
+            content_type="application/msgpack",
+            headers={"Accept": "application/msgpack"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/msgpack")
+        self.assertEqual(
+            msgpack.unpackb(response.data),
+            {"intents": [[{"label": "flight"}], [{"label": "airfare"}]], "model": "0"},
+        )
+
+    def test_response_negotiation(self):
+        for accept, mimetype in (
+            (None, "application/json"),
+            ("*/*", "application/json"),
+            ("application/x-msgpack", "application/x-msgpack"),
+            ("application/json;q=0.5, application/msgpack", "application/msgpack"),
+        ):
+            headers = {"Accept": accept} if accept else {}
+            response = self.client.get("/info", headers=headers)
+            self.assertEqual(response.mimetype, mimetype)
+
+    def test_label_indices(self):
+        response = self.client.post(
+            "/intent", json={"text": "some text", "label_indices": True}
+        )
+        self.assertEqual(response.json["intents"], [1, 0])
+        self.assertEqual(
+            self.client.get("/info").json["models"][0]["labels"], ["flight", "airfare"]
+        )
+
+    def test_server_timing(self):
+        response = self.client.post("/intent", json={"text": "some text"})
+        metrics = dict(
+            metric.split(";dur=")
+            for metric in response.headers["Server-Timing"].split(", ")
+        )
+        self.assertEqual(set(metrics), {"decode", "encode"})
+        for duration in metrics.values():
+            self.assertGreaterEqual(float(duration), 0)
+
+    def test_body_missing(self):
+        for kwargs in (
+            {},
+            {"data": "text", "content_type": "text/plain"},
+            {"data": b"\xc1", "content_type": "application/msgpack"},
+        ):
+            response = self.client.post("/intent", **kwargs)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json["label"], "BODY_MISSING")
+
+    def test_text_missing(self):
+        response = self.client.post("/intent", json={"txt": "some text"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json["label"], "TEXT_MISSING")
+
+    def test_deadline_invalid(self):
+        for deadline_ms in (0, -5, "100", True):
+            response = self.client.post(
+                "/intent", json={"text": "some text", "deadline_ms": deadline_ms}
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json["label"], "DEADLINE_INVALID")
+
+        for deadline_ms in (float("nan"), float("inf")):
+            response = self.client.post(
+                "/intent",
+                data=msgpack.packb({"text": "some text", "deadline_ms": deadline_ms}),
+                content_type="application/msgpack",
+            )
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json["label"], "DEADLINE_INVALID")
+
+        response = self.client.post(
+            "/intent", json={"text": "some text", "deadline_ms": 100}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_request_start(self):
+        for request_start in ("t=inf", "t=1e400", "t=nan", "t=-inf", "soon"):
+            response = self.client.post(
+                "/intent",
+                json={"text": "some text", "deadline_ms": 100},
+                headers={"X-Request-Start": request_start},
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def test_resources(self):
+        test_model = server.models.models[0]
+        test_model.load_time = 1.5
+        test_model.memory_info.return_value = {"parameter_bytes": 1024}
+
+        response = self.client.get("/resources")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json["models"][0]["parameter_bytes"], 1024)
+        self.assertIn("rss_bytes", response.json["process"])
+
+        response = self.client.get("/resources?trace=0.01&top=3")
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(response.json["allocations"]), 3)
+
+    def test_resources_trace_invalid(self):
+        for query in (
+            "trace=0",
+            "trace=61",
+            "trace=abc",
+            "trace=nan",
+            "trace=1&top=-1",
+            "trace=1&top=0",
+            "top=%C2%B2",
+            "top=abc",
+        ):
+            response = self.client.get(f"/resources?{query}")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json["label"], "TRACE_INVALID")
+
+
+if __name__ == "__main__":
+    main()